@@ -3,12 +3,15 @@
 #!/usr/bin/env python3
 
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, Request, abort, request
-from routes import main_bp
-from config import Config
+from python.routes import main_bp
+from python.config import Config
 
-# Set up root logger
-logging.basicConfig(level=logging.DEBUG,
+# Set up root logger; LOG_LEVEL=DEBUG turns on the per-request and per-file detail,
+# here and in the utils.log loggers (FFS_LOG_LEVEL sets those on their own)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                     handlers=[logging.StreamHandler()])
 
@@ -21,6 +24,22 @@ def create_app():
     app = Flask(__name__, static_folder='static')
     app.config.from_object(Config)
     
+    # Create the output directory if it doesn't exist
+    if not Config.OUTPUT_DIR.is_dir():
+        Config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    # Long-running work such as archive extraction is handed off to this pool
+    app.extensions['executor'] = ThreadPoolExecutor(max_workers=os.cpu_count())
+    app.extensions['jobs'] = {}
+    
+    # Built once so the per-request check is a single frozenset lookup
+    app._allowed_ips = frozenset(app.config['ALLOWED_IP']) | frozenset({'127.0.0.1', '::1', 'localhost'})
+    
+    @app.before_request
+    def limit_remote_addr():
+        if request.remote_addr not in app._allowed_ips:
+            abort(403, description="Access denied.")
+    
     app.register_blueprint(main_bp)
     
     return app
@@ -5,20 +5,35 @@ from pathlib import Path
 
 FLASK_PORT = os.environ.get('FLASK_PORT', '5000')
 
-# Define the output directory
+# Define the output directory (created by create_app, so importing this module has no side effects)
 OUTPUT_DIR = Path(os.path.expanduser("~/uploads"))
 
-# Create the output directory if it doesn't exist
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
 ALLOWED_IP = {'127.0.0.1'}
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', os.urandom(32))
     UPLOAD_FOLDER = str(OUTPUT_DIR)
     OUTPUT_DIR = OUTPUT_DIR  # Add this line
+    ALLOWED_IP = ALLOWED_IP
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024 * 1024  # 10 GB
-    ALLOWED_EXTENSIONS = {
+    STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB per read from request.stream
+    MULTIPART_UPLOAD_LIMIT = 1024 * 1024  # Larger uploads must use /upload-stream/
+    # Behind Apache/lighttpd: let the front-end server send file bodies with sendfile(2)
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    # Behind nginx: internal location aliased to OUTPUT_DIR, e.g. '/protected/'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
+    # Same for cached folder ZIPs: internal location aliased to ZIP_CACHE_DIR
+    ZIP_CACHE_ACCEL_PREFIX = os.environ.get('ZIP_CACHE_ACCEL_PREFIX', '')
+    # Finished folder downloads are kept here (outside OUTPUT_DIR) and reused until the folder changes
+    JOB_RESULT_TTL = 60 * 60  # Seconds a finished upload_zip job is kept for /jobs/<id> to report
+    ZIP_CACHE_DIR = Path(os.environ.get('ZIP_CACHE_DIR', os.path.expanduser("~/.cache/flask-file-server")))
+    ZIP_CACHE_MAX_AGE = 24 * 60 * 60  # Seconds since last use before a cached ZIP is removed
+    ZIP_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024  # Total size of cached ZIPs; least recently used go first
+    ZIP_COMPRESS_LEVEL = 1  # Deflate level for ZIP downloads; 1 is far faster for little size cost
+    ZIP_WHOLE_FILE_LIMIT = 64 * 1024 * 1024  # Files up to this size are deflated in one libdeflate call
+    ZIP_PARALLEL_BUFFER = 256 * 1024 * 1024  # Max file data held in memory while entries are deflated in parallel
+    ZSTD_LEVEL = 3  # Level for .tar.zst folder downloads (needs the optional zstandard package)
+    ALLOWED_EXTENSIONS = frozenset({
         # Documents
         'txt', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp',
         'rtf', 'tex', 'wpd', 'csv', 'md', 'json', 'xml',
@@ -42,4 +57,4 @@ class Config:
         # Other
         'log', 'ini', 'cfg', 'conf', 'yaml', 'yml', 'toml', 'db', 'sqlite', 'exe', 'dll',
         'iso', 'bin', 'dat'
-    }
+    })
@@ -1,45 +1,103 @@
 # file_manager.py
 
-import logging
 import os
-from flask import send_from_directory, abort, jsonify, request
+import threading
+import time
+from collections import OrderedDict
+from flask import abort, jsonify, request
 from werkzeug.utils import secure_filename
 from python.config import Config
-from python.utils import allowed_file, send_zip, create_logger
+from python.utils import allowed_file, send_download, send_zip, create_logger, partial_upload_name, is_partial_upload
 from pathlib import Path
+from os.path import join, normpath
+from stat import S_ISDIR, S_ISREG
 
 logger = create_logger('file_manager')
-logger.setLevel(logging.DEBUG)
+
+_OUTPUT_DIR = str(Config.OUTPUT_DIR)
+
+# Directory listings keyed by path and validated against the directory's
+# (st_mtime_ns, st_size), which change whenever an entry is added, removed or renamed.
+# Only names and types are cached: rewriting a file in place changes neither, so
+# sizes and times are read fresh on every listing.
+_LISTING_CACHE_SIZE = 1024
+_listing_cache = OrderedDict()
+_listing_lock = threading.Lock()
+
+def _scan_directory(dir_path):
+    folders = []
+    files = []
+    # DirEntry carries the d_type from getdents, so is_dir() needs no stat
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if is_partial_upload(entry.name):
+                continue  # An upload still being written by save_stream
+            if entry.is_dir(follow_symlinks=False):
+                folders.append(entry.name)
+            else:
+                files.append(entry.name)
+    return tuple(folders), tuple(files)
+
+def _stat_entries(dir_path, names):
+    items = []
+    for name in names:
+        try:
+            st = os.lstat(join(dir_path, name))
+        except FileNotFoundError:
+            continue  # Removed since the directory was read
+        items.append({
+            'name': name,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'modified': time.strftime('%Y-%m-%d %H:%M', time.localtime(st.st_mtime)),
+        })
+    return items
+
+def invalidate_listing(dir_path):
+    """
+    Drops the cached listing of a directory. Call after adding entries to it,
+    since two changes within one mtime tick leave the directory's stamp unchanged.
+    """
+    with _listing_lock:
+        _listing_cache.pop(normpath(dir_path), None)
 
 def list_directory(path):
     try:
-        logger.info(f"Listing directory: {path}")
-        dir_path = Path(Config.OUTPUT_DIR) / path
-        logger.info(f"Directory path: {dir_path}")
+        logger.info("Listing directory: %s", path)
+        key = normpath(join(_OUTPUT_DIR, path))
+        logger.info("Directory path: %s", key)
         
-        if not dir_path.exists():
-            logger.info(f"Creating directory: {dir_path}")
-            os.makedirs(dir_path, exist_ok=True)
+        st = os.stat(key)
+        stamp = (st.st_mtime_ns, st.st_size)
         
-        items = os.listdir(dir_path)
-        logger.info(f"Items in directory: {items}")
-        
-        files = []
-        folders = []
-        for item in items:
-            full_path = dir_path / item
-            if full_path.is_dir():
-                folders.append(item)
+        with _listing_lock:
+            cached = _listing_cache.get(key)
+            if cached and cached[0] == stamp:
+                _listing_cache.move_to_end(key)
+                listing = cached[1]
             else:
-                files.append(item)
+                listing = None
+        
+        if listing is None:
+            listing = _scan_directory(key)
+            with _listing_lock:
+                _listing_cache[key] = (stamp, listing)
+                _listing_cache.move_to_end(key)
+                if len(_listing_cache) > _LISTING_CACHE_SIZE:
+                    _listing_cache.popitem(last=False)
         
-        logger.info(f"Folders: {folders}")
-        logger.info(f"Files: {files}")
+        folders = _stat_entries(key, listing[0])
+        files = _stat_entries(key, listing[1])
+        logger.debug("Folders: %s", folders)
+        logger.debug("Files: %s", files)
         
         return {'folders': folders, 'files': files}
+    except (FileNotFoundError, NotADirectoryError):
+        logger.warning("Directory not found: %s", path)
+        return {'folders': (), 'files': ()}
     except Exception as e:
-        logger.exception(f"Error accessing directory {path}: {e}")
-        return {'folders': [], 'files': []}
+        logger.exception("Error accessing directory %s: %s", path, e)
+        return {'folders': (), 'files': ()}
 
 def save_file(file_storage, destination):
     if not allowed_file(file_storage.filename):
@@ -48,11 +106,42 @@ def save_file(file_storage, destination):
     file_path = destination / filename
     try:
         file_storage.save(file_path)
+        invalidate_listing(destination)
         return filename
     except Exception as e:
-        print(f"Error saving file {filename}: {e}")
+        logger.exception("Error saving file %s: %s", filename, e)
         return None
 
+def save_stream(stream, file_path, chunk_size=Config.STREAM_CHUNK_SIZE):
+    """
+    Writes a raw request body to file_path in fixed-size chunks, bypassing
+    Werkzeug's multipart parser and its spooled temporary files. Returns the
+    number of bytes written. The body goes to a temporary file next to the
+    target, which replaces it only once the transfer has finished, so an
+    aborted upload leaves any existing file untouched. Listings and archives
+    skip that file while it is being written.
+    """
+    directory, filename = os.path.split(file_path)
+    temp_path = os.path.join(directory, partial_upload_name(filename))
+    # Created with the same mode as a direct write would be, so the umask still applies
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    written = 0
+    try:
+        while chunk := stream.read(chunk_size):
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(fd, view):]
+            written += len(chunk)
+        os.close(fd)
+        fd = None
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        os.unlink(temp_path)
+        raise
+    return written
+
 def download_file(path):
     """
     Handles file or directory download. If path is a file, it sends the file.
@@ -60,15 +149,20 @@ def download_file(path):
     """
     try:
         target_path = Path(Config.OUTPUT_DIR) / path
-        if target_path.is_file():
-            return send_from_directory(target_path.parent, target_path.name, as_attachment=True)
-        elif target_path.is_dir():
+        try:
+            st = os.stat(target_path)
+        except FileNotFoundError:
+            st = None
+        
+        if st is not None and S_ISREG(st.st_mode):
+            return send_download(target_path, st)
+        elif st is not None and S_ISDIR(st.st_mode):
             archive_name = f"{target_path.name}.zip"
             return send_zip(target_path, archive_name)
         else:
             abort(404, description="File or directory not found.")
     except Exception as e:
-        print(f"Error downloading {path}: {e}")
+        logger.exception("Error downloading %s: %s", path, e)
         abort(500, description="Internal Server Error.")
 
 def remove_file(path):
@@ -82,14 +176,19 @@ def remove_file(path):
         
         abs_path = Path(Config.OUTPUT_DIR) / file_to_remove
         
-        if not abs_path.is_file():
+        try:
+            st = os.lstat(abs_path)
+        except FileNotFoundError:
+            st = None
+        if st is None or not S_ISREG(st.st_mode):
             return jsonify({'status': 'error', 'message': 'File does not exist.'}), 404
         
-        abs_path.unlink()  # Delete the file
-        logger.info(f"Removed file: {abs_path}")
+        os.unlink(abs_path)  # Delete the file
+        invalidate_listing(abs_path.parent)
+        logger.info("Removed file: %s", abs_path)
         
         return jsonify({'status': 'success', 'message': f'File "{abs_path.name}" removed successfully.'}), 200
     except Exception as e:
-        logger.exception(f"Error removing file: {e}")
+        logger.exception("Error removing file: %s", e)
         return jsonify({'status': 'error', 'message': f'Error removing file: {e}'}), 500
 
@@ -3,46 +3,110 @@
 import logging
 import os
 import tempfile
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_file, jsonify
+import time
+from flask import Blueprint, Response, abort, g, render_template, request, redirect, url_for, flash, current_app, jsonify, stream_with_context
 from flask.views import MethodView
-from file_manager import list_directory, save_file, download_file, remove_file
-from utils import allowed_file, extract_archive, create_logger, send_compressed, is_7z_available, compress_directory
+from python.file_manager import list_directory, invalidate_listing, save_file, save_stream, download_file, remove_file
+from python.utils import allowed_file, extract_archive, create_logger, send_compressed, send_download, set_attachment, secure_path, HAS_7Z, stream_zip, zip_cache_path, prune_zip_cache, cache_stream, zip_entries, stored_zip_size
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 from pathlib import Path
-from config import Config
-import subprocess
-import zipfile
+from os.path import join, dirname, normpath
+from stat import S_ISDIR, S_ISLNK, S_ISREG
+from python.config import Config
 import shutil
+from uuid import uuid4
+
+_HOME_DIR = os.path.expanduser("~")
 
 def get_masked_path(full_path):
-    home_dir = os.path.expanduser("~")
-    if full_path.startswith(home_dir):
-        return f"~/...{full_path[len(home_dir):]}"
+    if full_path.startswith(_HOME_DIR):
+        return f"~/...{full_path[len(_HOME_DIR):]}"
     return full_path
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+def ensure_dir(path):
+    """
+    Creates a folder and its parents unless this request has already done so.
+    Known folders are remembered on flask.g, which only lives for the current
+    request, so repeated calls for the same tree cost no syscalls.
+    """
+    known = g.setdefault('known_dirs', set())
+    key = str(path)
+    if key in known:
+        return
+    os.makedirs(key, exist_ok=True)
+    while key not in known and key != _OUTPUT_DIR and key != os.path.dirname(key):
+        known.add(key)
+        key = os.path.dirname(key)
+
+def save_upload(file, file_path):
+    """
+    Saves one file for upload_folder. Returns False instead of raising so one
+    bad file does not abort the rest of the batch.
+    """
+    try:
+        file.save(file_path)
+        return True
+    except Exception as e:
+        logger.exception("Error saving file %s: %s", file_path, e)
+        return False
+
+def extract_upload(temp_dir, archive_path, extract_to):
+    """
+    Background job for upload_zip: extracts the archive, then removes the
+    temporary directory it was saved in.
+    """
+    try:
+        extract_archive(archive_path, extract_to)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        invalidate_listing(extract_to)
+
+def _mark_finished(future):
+    future.finished_at = time.monotonic()
+
+def prune_jobs(jobs):
+    """
+    Forgets jobs that finished more than Config.JOB_RESULT_TTL seconds ago and
+    were never polled for, so the job table does not grow without bound.
+    """
+    cutoff = time.monotonic() - Config.JOB_RESULT_TTL
+    for job_id, future in list(jobs.items()):
+        if getattr(future, 'finished_at', cutoff) < cutoff:
+            jobs.pop(job_id, None)
 
 main_bp = Blueprint('main', __name__)
 
+_OUTPUT_DIR = str(Config.OUTPUT_DIR)
+
 class FileSystemView(MethodView):
     def get(self, req_path=''):
-        logger.debug(f"GET request received for path: {req_path}")
+        logger.debug("GET request received for path: %s", req_path)
         try:
-            logger.info(f"Accessing path: {req_path}")
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
-            logger.info(f"Absolute path: {abs_path}")
+            logger.info("Accessing path: %s", req_path)
+            abs_path = os.fspath(secure_path(req_path))
+            logger.info("Absolute path: %s", abs_path)
             
-            if abs_path.is_file():
-                logger.info(f"Downloading file: {abs_path}")
-                return send_file(abs_path, as_attachment=True)
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                st = None
+            
+            if st is not None and S_ISREG(st.st_mode):
+                logger.info("Downloading file: %s", abs_path)
+                return send_download(abs_path, st)
+            if st is None or not S_ISDIR(st.st_mode):
+                logger.info("Path not found: %s", abs_path)
+                abort(404, description="Path not found.")
             
-            contents = list_directory(req_path)
-            logger.info(f"Directory contents: {contents}")
+            contents = list_directory(abs_path)
+            logger.debug("Directory contents: %s", contents)
             current_path = req_path.strip('/')
-            parent_path = str(Path(current_path).parent)
+            parent_path = dirname(current_path) or '.'
             
-            masked_path = get_masked_path(str(abs_path))
+            masked_path = get_masked_path(abs_path)
             
             logger.debug("Rendering index.html template")
             return render_template('index.html', 
@@ -50,15 +114,23 @@ class FileSystemView(MethodView):
                                    current_path=current_path, 
                                    parent_path=parent_path,
                                    masked_path=masked_path)
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.exception(f"Error in GET method: {str(e)}")
+            logger.exception("Error in GET method: %s", e)
             flash(str(e), 'danger')
             return redirect(url_for('main.file_system'))
 
     def post(self, req_path=''):
-        logger.debug(f"POST request received for path: {req_path}")
-        action = request.form.get('action')
-        logger.info(f"Action requested: {action}")
+        logger.debug("POST request received for path: %s", req_path)
+        # Reject oversized posts before request.form makes Werkzeug parse and spool the body.
+        # upload_zip is the one action that takes large bodies; it must be named in the query string.
+        action = request.args.get('action')
+        if action != 'upload_zip' and request.content_length and request.content_length > Config.MULTIPART_UPLOAD_LIMIT:
+            logger.warning("Form post too large: %s bytes", request.content_length)
+            return jsonify({'status': 'error', 'message': 'Upload too large for a form post, use /upload-stream/ instead.'}), 413
+        action = action or request.form.get('action')
+        logger.info("Action requested: %s", action)
         
         if action == 'upload_file':
             return self.upload_file(req_path)
@@ -73,37 +145,42 @@ class FileSystemView(MethodView):
         elif action == 'remove':
             return self.remove_file(req_path)
         else:
-            logger.warning(f"Invalid action requested: {action}")
+            logger.warning("Invalid action requested: %s", action)
             flash('Invalid action', 'danger')
             return redirect(url_for('main.file_system', req_path=req_path))
 
     def upload_file(self, req_path):
         try:
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
-            logger.debug(f"Upload destination for file: {abs_path}")
+            try:
+                abs_path = secure_path(req_path)
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
+            logger.debug("Upload destination for file: %s", abs_path)
             if not abs_path.is_dir():
-                logger.error(f"Upload destination is not a directory: {abs_path}")
+                logger.error("Upload destination is not a directory: %s", abs_path)
                 return jsonify({'status': 'error', 'message': "Upload destination is not a directory."}), 400
 
             files = request.files.getlist('files[]')
-            logger.debug(f"Number of files received: {len(files)}")
+            logger.debug("Number of files received: %s", len(files))
 
             uploaded_count = 0
             uploaded_files = []
 
             for file in files:
                 if file and file.filename:
-                    logger.debug(f"Processing file: {file.filename}")
+                    logger.debug("Processing file: %s", file.filename)
                     filename = secure_filename(file.filename)
                     file_path = abs_path / filename
-                    logger.debug(f"File will be saved to: {file_path}")
+                    logger.debug("File will be saved to: %s", file_path)
                     
                     if allowed_file(filename):
                         file.save(file_path)
                         uploaded_count += 1
                         uploaded_files.append(str(file_path.relative_to(abs_path)))
                     else:
-                        logger.warning(f"File type not allowed: {filename}")
+                        logger.warning("File type not allowed: %s", filename)
+
+            invalidate_listing(abs_path)
 
             if not uploaded_files:
                 logger.warning("No files uploaded")
@@ -117,22 +194,25 @@ class FileSystemView(MethodView):
                 'uploaded_files': uploaded_files
             }), 200
         except Exception as e:
-            logger.exception(f"Error uploading files: {str(e)}")
+            logger.exception("Error uploading files: %s", e)
             return jsonify({'status': 'error', 'message': f'Error uploading files: {str(e)}'}), 500
 
     def upload_folder(self, req_path):
         try:
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
-            logger.debug(f"Upload destination for folder: {abs_path}")
+            try:
+                abs_path = secure_path(req_path)
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
+            logger.debug("Upload destination for folder: %s", abs_path)
             if not abs_path.is_dir():
-                logger.error(f"Upload destination is not a directory: {abs_path}")
+                logger.error("Upload destination is not a directory: %s", abs_path)
                 return jsonify({'status': 'error', 'message': "Upload destination is not a directory."}), 400
 
             files = request.files.getlist('files[]')
-            logger.debug(f"Number of files received in folder: {len(files)}")
+            logger.debug("Number of files received in folder: %s", len(files))
 
             folders = request.form.getlist('folders[]')
-            logger.debug(f"Number of folders received: {len(folders)}")
+            logger.debug("Number of folders received: %s", len(folders))
 
             if not files and not folders:
                 logger.warning("No files or folders received")
@@ -141,28 +221,58 @@ class FileSystemView(MethodView):
             uploaded_count = 0
             uploaded_files = []
             created_folders = []
+            pending = []
+            # Plain string paths: a Path per entry costs several allocations on big folders
+            base = os.fspath(abs_path)
+            prefix = os.path.join(base, '')
 
             for file in files:
                 if file and file.filename:
-                    logger.debug(f"Processing file in folder: {file.filename}")
-                    relative_path = file.filename
-                    file_path = abs_path / relative_path
-                    logger.debug(f"File will be saved to: {file_path}")
-                    file_path.parent.mkdir(parents=True, exist_ok=True)  # Create subdirectories if needed
+                    logger.debug("Processing file in folder: %s", file.filename)
+                    file_path = normpath(join(base, file.filename))
+                    logger.debug("File will be saved to: %s", file_path)
                     
-                    if allowed_file(file.filename):
-                        file.save(file_path)
-                        uploaded_count += 1
-                        uploaded_files.append(str(file_path.relative_to(abs_path)))
+                    if not file_path.startswith(prefix):
+                        logger.warning("File path escapes the upload folder: %s", file.filename)
+                    elif allowed_file(file.filename):
+                        pending.append((file, file_path))
                     else:
-                        logger.warning(f"File type not allowed: {file.filename}")
+                        logger.warning("File type not allowed: %s", file.filename)
+
+            # Names were checked as strings; resolve each distinct folder once so an
+            # existing symlink under the target cannot lead outside it
+            parents = {dirname(file_path) for _, file_path in pending}
+            escaping = {parent for parent in parents
+                        if os.path.commonpath([base, os.path.realpath(parent)]) != base}
+            if escaping:
+                logger.warning("Skipping files under folders that resolve outside the upload folder: %s", escaping)
+                pending = [item for item in pending if dirname(item[1]) not in escaping]
+                parents -= escaping
+
+            if pending:
+                # Create subdirectories once, up front. Deepest first: each one
+                # marks its ancestors as existing for the rest of the request.
+                for parent in sorted(parents, key=lambda p: p.count(os.sep), reverse=True):
+                    ensure_dir(parent)
+
+                # The whole body is under MULTIPART_UPLOAD_LIMIT and mostly spooled in
+                # memory, so the files are saved one after another
+                for file, file_path in pending:
+                    if save_upload(file, file_path):
+                        uploaded_count += 1
+                        uploaded_files.append(file_path[len(prefix):])
+                for parent in parents:
+                    invalidate_listing(parent)
 
             # Handle folder creation for empty folders
             for folder in folders:
-                folder_path = abs_path / folder
-                logger.debug(f"Creating folder: {folder_path}")
-                folder_path.mkdir(parents=True, exist_ok=True)
-                created_folders.append(str(folder_path.relative_to(abs_path)))
+                folder_path = normpath(join(base, folder))
+                if not folder_path.startswith(prefix) or os.path.commonpath([base, os.path.realpath(folder_path)]) != base:
+                    logger.warning("Folder path escapes the upload folder: %s", folder)
+                    continue
+                logger.debug("Creating folder: %s", folder_path)
+                ensure_dir(folder_path)
+                created_folders.append(folder_path[len(prefix):])
 
             if not uploaded_files and not created_folders:
                 logger.warning("No files uploaded and no folders created")
@@ -179,27 +289,30 @@ class FileSystemView(MethodView):
                 'created_folders': created_folders
             }), 200
         except Exception as e:
-            logger.exception(f"Error uploading folder: {str(e)}")
+            logger.exception("Error uploading folder: %s", e)
             return jsonify({'status': 'error', 'message': f'Error uploading folder: {str(e)}'}), 500
 
     def create_folder(self, req_path):
-        logger.info(f"Create folder route accessed with req_path: {req_path}")
+        logger.info("Create folder route accessed with req_path: %s", req_path)
         try:
-            logger.info(f"Creating folder in path: {req_path}")
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
-            logger.info(f"Absolute path: {abs_path}")
+            logger.info("Creating folder in path: %s", req_path)
+            abs_path = secure_path(req_path)
+            logger.info("Absolute path: %s", abs_path)
             folder_name = request.form.get('folder_name')
-            logger.info(f"Folder name: {folder_name}")
+            logger.info("Folder name: %s", folder_name)
             
             if folder_name:
                 new_folder_path = abs_path / secure_filename(folder_name)
-                logger.info(f"New folder path: {new_folder_path}")
+                logger.info("New folder path: %s", new_folder_path)
                 os.makedirs(new_folder_path, exist_ok=True)
+                invalidate_listing(abs_path)
                 flash(f'Folder "{folder_name}" created successfully', 'success')
             else:
                 flash('Folder name cannot be empty', 'danger')
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.exception(f"Error creating folder: {str(e)}")
+            logger.exception("Error creating folder: %s", e)
             flash(f'Error creating folder: {str(e)}', 'danger')
         
         return redirect(url_for('main.file_system', req_path=req_path))
@@ -207,76 +320,93 @@ class FileSystemView(MethodView):
     def upload_zip(self, req_path):
         temp_dir = None
         try:
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
+            try:
+                abs_path = secure_path(req_path)
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
             if not abs_path.is_dir():
-                flash("Upload destination is not a directory.", "danger")
-                return redirect(url_for('main.file_system', req_path=req_path))
+                logger.error("Upload destination is not a directory: %s", abs_path)
+                return jsonify({'status': 'error', 'message': "Upload destination is not a directory."}), 400
             
             if 'archive_file' not in request.files:
-                flash('No archive file part', 'danger')
-                return redirect(url_for('main.file_system', req_path=req_path))
+                return jsonify({'status': 'error', 'message': 'No archive file part'}), 400
             
             archive_file = request.files['archive_file']
             
             if archive_file.filename == '':
-                flash('No selected archive file', 'danger')
-                return redirect(url_for('main.file_system', req_path=req_path))
+                return jsonify({'status': 'error', 'message': 'No selected archive file'}), 400
             
-            if archive_file.filename.lower().endswith('.7z') and not is_7z_available():
-                flash('7z archives are not supported on this server. Please use ZIP instead.', 'danger')
-                return redirect(url_for('main.file_system', req_path=req_path))
+            if archive_file.filename.lower().endswith('.7z') and not HAS_7Z:
+                return jsonify({'status': 'error', 'message': '7z archives are not supported on this server. Please use ZIP instead.'}), 400
             
             # Create a temporary directory
             temp_dir = tempfile.mkdtemp(dir=abs_path)
             temp_archive_path = Path(temp_dir) / secure_filename(archive_file.filename)
             archive_file.save(temp_archive_path)
             
-            try:
-                extract_archive(temp_archive_path, abs_path)
-                flash('Archive uploaded and extracted successfully', 'success')
-            except (subprocess.CalledProcessError, zipfile.BadZipFile):
-                flash('Failed to extract the archive', 'danger')
+            # Extraction runs in the background; the job removes the temp dir when it finishes
+            future = current_app.extensions['executor'].submit(extract_upload, temp_dir, temp_archive_path, abs_path)
+            future.add_done_callback(_mark_finished)
+            temp_dir = None
+            job_id = uuid4().hex
+            jobs = current_app.extensions['jobs']
+            prune_jobs(jobs)
+            jobs[job_id] = future
+            logger.info("Queued extraction job %s for: %s", job_id, temp_archive_path)
+            return jsonify({'status': 'pending', 'job_id': job_id}), 202
         except Exception as e:
-            flash(str(e), 'danger')
+            logger.exception("Error uploading archive: %s", e)
+            return jsonify({'status': 'error', 'message': f'Error uploading archive: {str(e)}'}), 500
         finally:
-            # Clean up temporary files
+            # Clean up temporary files if the job was never queued
             if temp_dir:
-                for root, dirs, files in os.walk(temp_dir, topdown=False):
-                    for name in files:
-                        os.remove(os.path.join(root, name))
-                    for name in dirs:
-                        os.rmdir(os.path.join(root, name))
-                os.rmdir(temp_dir)
-        
-        return redirect(url_for('main.file_system', req_path=req_path))
+                shutil.rmtree(temp_dir, ignore_errors=True)
 
     def download_folder(self, req_path):
-        temp_file = None
         try:
-            abs_path = Path(Config.OUTPUT_DIR) / req_path
+            abs_path = secure_path(req_path)
             if not abs_path.is_dir():
                 flash("Download path is not a directory.", "danger")
                 return redirect(url_for('main.file_system', req_path=req_path))
             
-            archive_name = f"{abs_path.name}.zip"  # Always use .zip extension
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
-            temp_file.close()
+            # ZIP stays the default for browsers; format=zst or format=7z opt into a tarball
+            archive_format = request.values.get('format', 'zip')
+            if archive_format != 'zip':
+                return send_compressed(abs_path, abs_path.name, archive_format)
             
-            compressed_file, mimetype = compress_directory(abs_path, Path(temp_file.name))
+            archive_name = f"{abs_path.name}.zip"
+            # One walk both fingerprints the folder and, on a miss, lists what to archive
+            entries = list(zip_entries(abs_path))
+            cache_path = zip_cache_path(abs_path, entries)
+            try:
+                st = os.stat(cache_path)
+            except FileNotFoundError:
+                st = None
+            if st is not None:
+                logger.info("Sending cached ZIP for folder: %s", abs_path)
+                os.utime(cache_path, ns=(time.time_ns(), st.st_mtime_ns))  # Mark as recently used so pruning keeps it
+                prune_zip_cache(keep=cache_path)
+                return send_download(
+                    cache_path, st,
+                    download_name=archive_name,
+                    root=Config.ZIP_CACHE_DIR,
+                    accel_prefix=Config.ZIP_CACHE_ACCEL_PREFIX
+                )
             
-            return send_file(
-                compressed_file,
-                mimetype=mimetype,
-                as_attachment=True,
-                download_name=archive_name
+            logger.info("Streaming folder as ZIP: %s", abs_path)
+            # The archive is stored, not deflated, so its size is known before it is built
+            response = Response(
+                stream_with_context(cache_stream(stream_zip(abs_path, entries=entries), cache_path)),
+                mimetype='application/zip',
+                headers={'Content-Length': str(stored_zip_size(entries))}
             )
+            return set_attachment(response, archive_name)
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.exception(f"Error downloading folder: {str(e)}")
+            logger.exception("Error downloading folder: %s", e)
             flash(f'Error downloading folder: {str(e)}', 'danger')
             return redirect(url_for('main.file_system', req_path=req_path))
-        finally:
-            if temp_file:
-                os.unlink(temp_file.name)
 
     def remove_file(self, req_path):
         try:
@@ -285,28 +415,119 @@ class FileSystemView(MethodView):
                 logger.warning("No item specified for removal.")
                 return jsonify({'status': 'error', 'message': 'No item specified for removal.'}), 400
             
-            abs_path = Path(Config.OUTPUT_DIR) / file_to_remove.lstrip('/')
-            logger.info(f"Attempting to remove item: {abs_path}")
+            # Only the parent is resolved, so a symlink is removed itself rather than its target
+            parent, name = os.path.split(file_to_remove.strip('/'))
+            if name in ('', '.', '..'):
+                return jsonify({'status': 'error', 'message': 'Invalid item path.'}), 400
+            try:
+                abs_path = secure_path(parent) / name
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
+            logger.info("Attempting to remove item: %s", abs_path)
             
-            if not abs_path.exists():
-                logger.warning(f"Item does not exist: {abs_path}")
+            # One lstat answers exists/is_file/is_dir; symlinks are removed, never followed
+            try:
+                st = os.lstat(abs_path)
+            except FileNotFoundError:
+                logger.warning("Item does not exist: %s", abs_path)
                 return jsonify({'status': 'error', 'message': 'Item does not exist.'}), 404
             
-            if abs_path.is_file():
-                abs_path.unlink()  # Delete the file
-                logger.info(f"Removed file: {abs_path}")
-            elif abs_path.is_dir():
+            if S_ISDIR(st.st_mode):
                 shutil.rmtree(abs_path)  # Delete the directory and its contents
-                logger.info(f"Removed directory: {abs_path}")
+                logger.info("Removed directory: %s", abs_path)
+            elif S_ISREG(st.st_mode) or S_ISLNK(st.st_mode):
+                os.unlink(abs_path)  # Delete the file
+                logger.info("Removed file: %s", abs_path)
+            else:
+                logger.warning("Unsupported item type: %s", abs_path)
+                return jsonify({'status': 'error', 'message': 'Unsupported item type.'}), 400
+            invalidate_listing(abs_path.parent)
             
             return jsonify({'status': 'success', 'message': f'Item "{abs_path.name}" removed successfully.'}), 200
         except PermissionError as e:
-            logger.error(f"Permission error removing item: {str(e)}")
+            logger.error("Permission error removing item: %s", e)
             return jsonify({'status': 'error', 'message': 'Permission denied when trying to remove the item.'}), 403
         except Exception as e:
-            logger.exception(f"Error removing item: {str(e)}")
+            logger.exception("Error removing item: %s", e)
             return jsonify({'status': 'error', 'message': f'Error removing item: {str(e)}'}), 500
 
+class StreamUploadView(MethodView):
+    """
+    Receives a single file as the raw request body and writes it straight to
+    disk, so large uploads never pass through the multipart parser.
+    The target name comes from the ``filename`` query parameter (or the
+    ``X-Filename`` header) and may contain ``/`` for files inside folders.
+    """
+    def put(self, req_path=''):
+        logger.debug("PUT stream upload received for path: %s", req_path)
+        try:
+            try:
+                abs_path = secure_path(req_path)
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
+            if not abs_path.is_dir():
+                logger.error("Upload destination is not a directory: %s", abs_path)
+                return jsonify({'status': 'error', 'message': "Upload destination is not a directory."}), 400
+
+            filename = request.args.get('filename') or request.headers.get('X-Filename', '')
+            parts = [part for part in (secure_filename(p) for p in filename.split('/')) if part]
+            if not parts:
+                logger.warning("No filename supplied for stream upload")
+                return jsonify({'status': 'error', 'message': 'No filename supplied.'}), 400
+
+            if not allowed_file(parts[-1]):
+                logger.warning("File type not allowed: %s", filename)
+                return jsonify({'status': 'error', 'message': 'File type not allowed.'}), 400
+
+            # Resolved again so a symlinked folder inside the target cannot lead outside the root
+            try:
+                file_path = secure_path(join(abs_path, *parts))
+            except HTTPException as e:
+                return jsonify({'status': 'error', 'message': e.description}), e.code
+            if len(parts) > 1:
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+
+            written = save_stream(request.stream, file_path)
+            invalidate_listing(file_path.parent)
+            logger.info("Streamed %s bytes to: %s", written, file_path)
+            return jsonify({
+                'status': 'success',
+                'message': '1 file(s) uploaded successfully',
+                'uploaded_files': ['/'.join(parts)]
+            }), 200
+        except Exception as e:
+            logger.exception("Error streaming upload: %s", e)
+            return jsonify({'status': 'error', 'message': f'Error uploading file: {str(e)}'}), 500
+
+class JobStatusView(MethodView):
+    """
+    Reports the state of a background job started by upload_zip. A finished
+    job is forgotten once its result has been returned, or after
+    Config.JOB_RESULT_TTL seconds if nobody asks.
+    """
+    def get(self, job_id):
+        jobs = current_app.extensions['jobs']
+        prune_jobs(jobs)
+        future = jobs.get(job_id)
+        if future is None:
+            return jsonify({'status': 'error', 'message': 'Unknown job.'}), 404
+        
+        if not future.done():
+            status = 'running' if future.running() else 'pending'
+            return jsonify({'status': status, 'job_id': job_id}), 200
+        
+        jobs.pop(job_id, None)
+        error = future.exception()
+        if error is not None:
+            return jsonify({'status': 'error', 'job_id': job_id, 'message': 'Failed to extract the archive'}), 200
+        return jsonify({'status': 'success', 'job_id': job_id, 'message': 'Archive uploaded and extracted successfully'}), 200
+
 file_system_view = FileSystemView.as_view('file_system')
+stream_upload_view = StreamUploadView.as_view('upload_stream')
+job_status_view = JobStatusView.as_view('job_status')
 main_bp.add_url_rule('/', view_func=file_system_view, methods=['GET', 'POST'])
 main_bp.add_url_rule('/<path:req_path>', view_func=file_system_view, methods=['GET', 'POST'])
+main_bp.add_url_rule('/upload-stream/', view_func=stream_upload_view, methods=['PUT'])
+main_bp.add_url_rule('/upload-stream/<path:req_path>', view_func=stream_upload_view, methods=['PUT'])
+# Job ids are 32 hex characters; the length keeps ordinary folders named "jobs" browsable
+main_bp.add_url_rule('/jobs/<string(length=32):job_id>', view_func=job_status_view, methods=['GET'])
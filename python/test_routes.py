@@ -0,0 +1,380 @@
+# test_routes.py
+import unittest
+from unittest import mock
+from pathlib import Path
+from app import create_app
+from python.config import Config
+from python.file_manager import save_stream, list_directory, invalidate_listing
+import python.file_manager as file_manager
+from python.utils import cache_stream, prune_zip_cache, HAS_ZSTD, zstandard
+import io
+import tarfile
+import zipfile
+import os
+import tempfile
+import time
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        """
+        Point the upload folder and the ZIP cache at temporary directories and create a test client.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.upload_folder = Path(self.temp_dir.name) / 'uploads'
+        self.cache_dir = Path(self.temp_dir.name) / 'cache'
+
+        self.patchers = [
+            mock.patch.object(Config, 'OUTPUT_DIR', self.upload_folder),
+            mock.patch.object(Config, 'UPLOAD_FOLDER', str(self.upload_folder)),
+            mock.patch.object(Config, 'ZIP_CACHE_DIR', self.cache_dir),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+        self.app = create_app()
+        self.client = self.app.test_client()
+        (self.upload_folder / 'file1.txt').write_text('This is file1.')
+
+    def tearDown(self):
+        """
+        Clean up the temporary directory after tests.
+        """
+        for patcher in self.patchers:
+            patcher.stop()
+        self.temp_dir.cleanup()
+
+    def test_download_folder_non_ascii_name(self):
+        """
+        Test that a folder whose name is not Latin-1 downloads with an RFC 5987 filename.
+        """
+        folder = self.upload_folder / '数据 "raw"'
+        folder.mkdir()
+        (folder / 'file2.txt').write_text('This is file2.')
+
+        response = self.client.post('/数据 "raw"', data={'action': 'download_folder'})
+
+        self.assertEqual(response.status_code, 200)
+        disposition = response.headers['Content-Disposition']
+        self.assertIn('filename=" \\"raw\\".zip"', disposition)
+        self.assertIn("filename*=UTF-8''%E6%95%B0%E6%8D%AE%20%22raw%22.zip", disposition)
+        with zipfile.ZipFile(io.BytesIO(response.data)) as zip_file:
+            self.assertEqual(zip_file.read('file2.txt'), b'This is file2.')
+
+    def test_missing_path_not_found(self):
+        """
+        Test that browsing to a path that does not exist answers 404 instead of an empty listing.
+        """
+        self.assertEqual(self.client.get('/nonexistent').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/').status_code, 404)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_download_accel_redirect_through_symlink(self):
+        """
+        Test that X-Accel-Redirect is used when the upload folder is reached through a symlink.
+        """
+        link = Path(self.temp_dir.name) / 'uploads-link'
+        link.symlink_to(self.upload_folder)
+
+        with mock.patch.object(Config, 'UPLOAD_FOLDER', str(link)), \
+                mock.patch.object(Config, 'X_ACCEL_REDIRECT_PREFIX', '/protected/'):
+            response = self.client.get('/file1.txt')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected/file1.txt')
+        self.assertEqual(response.data, b'')
+
+    def test_upload_folder(self):
+        """
+        Test that upload_folder saves nested files and creates empty folders.
+        """
+        response = self.client.post('/', data={
+            'action': 'upload_folder',
+            'files[]': [(io.BytesIO(b'One.'), 'tree/one.txt'), (io.BytesIO(b'Two.'), 'tree/sub/two.txt')],
+            'folders[]': 'tree/empty',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json['uploaded_files']), ['tree/one.txt', 'tree/sub/two.txt'])
+        self.assertEqual((self.upload_folder / 'tree' / 'sub' / 'two.txt').read_bytes(), b'Two.')
+        self.assertTrue((self.upload_folder / 'tree' / 'empty').is_dir())
+
+    def _upload_zip(self, data):
+        response = self.client.post('/?action=upload_zip', data={'archive_file': (io.BytesIO(data), 'archive.zip')})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json['job_id']
+        future = self.app.extensions['jobs'][job_id]
+        future.exception()  # Wait for the extraction to finish
+        while not hasattr(future, 'finished_at'):
+            time.sleep(0.01)  # Done callbacks run just after waiters are woken
+        return job_id
+
+    def test_job_status(self):
+        """
+        Test that /jobs reports a finished extraction once, then forgets it.
+        """
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('extracted/file2.txt', 'This is file2.')
+        job_id = self._upload_zip(zip_buffer.getvalue())
+
+        response = self.client.get(f'/jobs/{job_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'success')
+        self.assertEqual((self.upload_folder / 'extracted' / 'file2.txt').read_text(), 'This is file2.')
+
+        self.assertEqual(self.client.get(f'/jobs/{job_id}').status_code, 404)
+        self.assertEqual(self.client.get(f'/jobs/{"0" * 32}').status_code, 404)
+
+    def test_job_status_failure(self):
+        """
+        Test that a failed extraction is reported as an error.
+        """
+        job_id = self._upload_zip(b'This is not a valid ZIP file.')
+
+        response = self.client.get(f'/jobs/{job_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'error')
+
+    def test_jobs_pruned_after_ttl(self):
+        """
+        Test that finished jobs nobody polls for are dropped after Config.JOB_RESULT_TTL.
+        """
+        job_id = self._upload_zip(b'This is not a valid ZIP file.')
+        self.assertIn(job_id, self.app.extensions['jobs'])
+
+        with mock.patch.object(Config, 'JOB_RESULT_TTL', -1):
+            self.assertEqual(self.client.get(f'/jobs/{"0" * 32}').status_code, 404)
+        self.assertNotIn(job_id, self.app.extensions['jobs'])
+
+    def test_stream_upload(self):
+        """
+        Test that a PUT to /upload-stream/ writes the body to the named file.
+        """
+        response = self.client.put('/upload-stream/?filename=folder/streamed.txt', data=b'Streamed content.')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['uploaded_files'], ['folder/streamed.txt'])
+        self.assertEqual((self.upload_folder / 'folder' / 'streamed.txt').read_bytes(), b'Streamed content.')
+
+    def test_save_stream_keeps_file_on_failure(self):
+        """
+        Test that an aborted save_stream leaves the existing file and no temporary file behind.
+        """
+        class FailingStream:
+            def __init__(self):
+                self.reads = 0
+
+            def read(self, size):
+                self.reads += 1
+                if self.reads > 1:
+                    raise OSError("Client disconnected.")
+                return b'Partial'
+
+        target = self.upload_folder / 'file1.txt'
+        with self.assertRaises(OSError):
+            save_stream(FailingStream(), target)
+
+        self.assertEqual(target.read_text(), 'This is file1.')
+        self.assertEqual(os.listdir(self.upload_folder), ['file1.txt'])
+
+    def test_save_stream_respects_umask(self):
+        """
+        Test that streamed uploads get their permissions from the process umask.
+        """
+        old_umask = os.umask(0o077)
+        try:
+            save_stream(io.BytesIO(b'Private content.'), self.upload_folder / 'private.txt')
+        finally:
+            os.umask(old_umask)
+
+        self.assertEqual((self.upload_folder / 'private.txt').stat().st_mode & 0o777, 0o600)
+
+    def test_partial_uploads_hidden(self):
+        """
+        Test that an upload still being written is neither listed nor archived.
+        """
+        (self.upload_folder / '.big.iso.0123456789abcdef0123456789abcdef.part').write_bytes(b'Partial')
+
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'.part', response.data)
+
+        response = self.client.post('/', data={'action': 'download_folder'})
+        with zipfile.ZipFile(io.BytesIO(response.data)) as zip_file:
+            self.assertEqual(zip_file.namelist(), ['file1.txt'])
+
+    def test_download_not_modified(self):
+        """
+        Test that a download answers 304 when the client already has the current ETag.
+        """
+        response = self.client.get('/file1.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'This is file1.')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/file1.txt', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        (self.upload_folder / 'file1.txt').write_text('This is file1, changed.')
+        response = self.client.get('/file1.txt', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_upload_folder_rejects_escape(self):
+        """
+        Test that upload_folder skips files whose relative path leaves the target folder.
+        """
+        response = self.client.post('/', data={
+            'action': 'upload_folder',
+            'files[]': (io.BytesIO(b'Malicious content.'), '../evil.txt'),
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse((self.upload_folder.parent / 'evil.txt').exists())
+
+    def test_upload_folder_rejects_symlink_escape(self):
+        """
+        Test that upload_folder does not write through a symlink that leads outside the upload folder.
+        """
+        with tempfile.TemporaryDirectory() as outside_dir:
+            (self.upload_folder / 'link').symlink_to(outside_dir)
+
+            response = self.client.post('/', data={
+                'action': 'upload_folder',
+                'files[]': (io.BytesIO(b'Malicious content.'), 'link/evil.txt'),
+            })
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(os.listdir(outside_dir), [])
+
+    def test_routes_reject_escape(self):
+        """
+        Test that request paths with encoded '..' segments cannot reach outside the upload folder.
+        """
+        outside = '/%2E%2E/%2E%2E/outside'
+        self.assertEqual(self.client.get(outside).status_code, 403)
+        self.assertEqual(self.client.post(outside, data={'action': 'download_folder'}).status_code, 403)
+        self.assertEqual(self.client.post(outside, data={'action': 'create_folder', 'folder_name': 'evil'}).status_code, 403)
+
+        response = self.client.post(outside, data={
+            'action': 'upload_file',
+            'files[]': (io.BytesIO(b'Malicious content.'), 'evil.txt'),
+        })
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.put('/upload-stream/%2E%2E?filename=evil.txt', data=b'Malicious content.')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse((self.upload_folder.parent / 'evil.txt').exists())
+
+    def test_cache_stream_removes_partial_file(self):
+        """
+        Test that closing cache_stream early, as happens when the client disconnects,
+        leaves neither the cache file nor its partial file.
+        """
+        cache_path = self.cache_dir / 'archive.zip'
+        chunks = cache_stream(iter([b'first', b'second']), cache_path)
+
+        self.assertEqual(next(chunks), b'first')
+        chunks.close()
+
+        self.assertFalse(cache_path.exists())
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_download_folder_cached(self):
+        """
+        Test that a folder ZIP is cached, reused while the folder is unchanged and rebuilt after a change.
+        """
+        first = self.client.post('/', data={'action': 'download_folder'})
+        self.assertEqual(first.status_code, 200)
+        archive = first.data
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        second = self.client.post('/', data={'action': 'download_folder'})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, archive)
+        self.assertIn('ETag', second.headers)
+
+        (self.upload_folder / 'file2.txt').write_text('This is file2.')
+        third = self.client.post('/', data={'action': 'download_folder'})
+        with zipfile.ZipFile(io.BytesIO(third.data)) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), ['file1.txt', 'file2.txt'])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)  # The stale archive is removed
+
+    @unittest.skipUnless(HAS_ZSTD, "zstandard is not installed")
+    def test_download_folder_zst(self):
+        """
+        Test that format=zst streams a .tar.zst that unpacks to the folder contents.
+        """
+        (self.upload_folder / 'subdir').mkdir()
+        (self.upload_folder / 'subdir' / 'file2.txt').write_text('This is file2.')
+
+        response = self.client.post('/', data={'action': 'download_folder', 'format': 'zst'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.tar.zst', response.headers['Content-Disposition'])
+
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(response.data))
+        with tarfile.open(fileobj=reader, mode='r|') as tar:
+            contents = {member.name: tar.extractfile(member).read() for member in tar if member.isfile()}
+        root = self.upload_folder.name  # Tarballs keep the folder itself as the top-level entry
+        self.assertEqual(sorted(contents), [f'{root}/file1.txt', f'{root}/subdir/file2.txt'])
+        self.assertEqual(contents[f'{root}/subdir/file2.txt'], b'This is file2.')
+
+    def test_prune_zip_cache_budget(self):
+        """
+        Test that pruning removes the least recently used archives until the rest fit the byte budget.
+        """
+        self.cache_dir.mkdir()
+        now = time.time()
+        for age, name in enumerate(['newest.zip', 'newer.zip', 'older.zip', 'oldest.zip']):
+            path = self.cache_dir / name
+            path.write_bytes(b'x' * 1000)
+            os.utime(path, (now - age, now))
+
+        prune_zip_cache(max_bytes=2500, keep=self.cache_dir / 'oldest.zip')
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['newest.zip', 'oldest.zip'])
+
+    def test_listing_cache(self):
+        """
+        Test that directory listings are cached until the directory changes or is invalidated.
+        """
+        folder = str(self.upload_folder)
+        with mock.patch.object(file_manager, '_scan_directory', wraps=file_manager._scan_directory) as scan:
+            self.assertEqual([f['name'] for f in list_directory(folder)['files']], ['file1.txt'])
+            list_directory(folder)
+            self.assertEqual(scan.call_count, 1)
+
+            # Rewriting a file in place keeps the cached names but shows the new size
+            (self.upload_folder / 'file1.txt').write_text('This is file1, rewritten.')
+            listing = list_directory(folder)
+            self.assertEqual(scan.call_count, 1)
+            self.assertEqual(listing['files'][0]['size'], len('This is file1, rewritten.'))
+
+            # Writers invalidate, since a new entry within one mtime tick leaves the stamp unchanged
+            st = os.stat(folder)
+            (self.upload_folder / 'file2.txt').write_text('This is file2.')
+            invalidate_listing(folder)
+            names = sorted(f['name'] for f in list_directory(folder)['files'])
+            self.assertEqual(names, ['file1.txt', 'file2.txt'])
+            self.assertEqual(scan.call_count, 2)
+
+            # A change to the directory's mtime is picked up without invalidation
+            (self.upload_folder / 'sub').mkdir()
+            os.utime(folder, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            self.assertEqual([f['name'] for f in list_directory(folder)['folders']], ['sub'])
+            self.assertEqual(scan.call_count, 3)
+
+    def test_remote_addr_allow_list(self):
+        """
+        Test that clients outside ALLOWED_IP are refused and listed ones are served.
+        """
+        response = self.client.get('/', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        self.assertEqual(response.status_code, 403)
+
+        with mock.patch.object(Config, 'ALLOWED_IP', {'203.0.113.7'}):
+            client = create_app().test_client()
+        response = client.get('/', environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
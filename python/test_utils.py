@@ -2,8 +2,9 @@
 import unittest
 from unittest import mock
 from pathlib import Path
-from python.utils import secure_path, allowed_file, zip_directory, unzip_file
+from python.utils import secure_path, allowed_file, zip_directory, unzip_file, stream_zip, zip_entries, stored_zip_size
 from python.config import Config
+import python.utils as python_utils
 import io
 import zipfile
 import tempfile
@@ -104,6 +105,29 @@ class TestUtils(unittest.TestCase):
             for file in expected_files:
                 self.assertIn(file, zip_contents)
 
+    def test_zip_directory_precompressed_entries(self):
+        """
+        Test that entries deflated ahead of time, with libdeflate or with zlib, form a valid archive.
+        """
+        contents = {
+            'text.txt': b'Repetitive text. ' * 5000,
+            'random.bin': os.urandom(100000),
+            'photo.jpg': os.urandom(5000),  # Stored, as already compressed
+            'empty.txt': b'',
+        }
+        for name, data in contents.items():
+            (self.upload_folder / name).write_bytes(data)
+
+        for deflate_module in {python_utils.libdeflate, None}:
+            with self.subTest(libdeflate=deflate_module is not None), \
+                    mock.patch.object(python_utils, 'libdeflate', deflate_module):
+                with zipfile.ZipFile(zip_directory(self.upload_folder)) as zip_file:
+                    self.assertIsNone(zip_file.testzip())
+                    for name, data in contents.items():
+                        self.assertEqual(zip_file.read(name), data)
+                    self.assertEqual(zip_file.getinfo('text.txt').compress_type, zipfile.ZIP_DEFLATED)
+                    self.assertEqual(zip_file.getinfo('photo.jpg').compress_type, zipfile.ZIP_STORED)
+
     def test_unzip_file(self):
         """
         Test that unzip_file correctly extracts a valid ZIP archive.
@@ -174,6 +198,94 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(cm.exception.code, 400)
         self.assertEqual(cm.exception.description, "Invalid ZIP file.")
 
+    def test_unzip_file_symlink_escape(self):
+        """
+        Test that unzip_file rejects members that would be written through a symlink
+        under the extract directory to a folder outside it.
+        """
+        extract_dir = self.upload_folder / 'extracted_symlink'
+        extract_dir.mkdir()
+
+        with tempfile.TemporaryDirectory() as outside_dir:
+            (extract_dir / 'link').symlink_to(outside_dir)
+
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+                zip_file.writestr('link/evil.txt', 'Malicious content.')
+            zip_buffer.seek(0)
+
+            with self.assertRaises(HTTPException) as cm:
+                unzip_file(zip_buffer, extract_dir)
+
+            self.assertEqual(cm.exception.code, 400)
+            self.assertFalse(os.path.exists(os.path.join(outside_dir, 'evil.txt')))
+
+    def test_unzip_file_parallel_nested(self):
+        """
+        Test that extraction split across worker threads recreates nested folders,
+        including empty ones, and every member's contents.
+        """
+        contents = {f'level{i % 3}/sub{i % 5}/deeper/file{i}.txt': f'Contents of file {i}.' * 100
+                    for i in range(40)}
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('empty/nested/', '')
+            for name, data in contents.items():
+                zip_file.writestr(name, data)
+        zip_buffer.seek(0)
+
+        extract_dir = self.upload_folder / 'extracted_parallel'
+        extract_dir.mkdir()
+
+        # Force several workers even on a single-CPU machine
+        with mock.patch.object(python_utils.os, 'cpu_count', return_value=4):
+            unzip_file(zip_buffer, extract_dir)
+
+        self.assertTrue((extract_dir / 'empty' / 'nested').is_dir())
+        for name, data in contents.items():
+            self.assertEqual((extract_dir / name).read_text(), data)
+
+    def test_stored_zip_size(self):
+        """
+        Test that stored_zip_size matches the length of the archive stream_zip writes,
+        including for non-ASCII file names.
+        """
+        (self.upload_folder / 'résumé.txt').write_text('Non-ASCII name.')
+        (self.upload_folder / 'subdir' / '数据.bin').write_bytes(os.urandom(3000))
+        (self.upload_folder / 'empty.txt').write_bytes(b'')
+
+        entries = list(zip_entries(self.upload_folder))
+        archive = b''.join(stream_zip(self.upload_folder, entries=entries))
+
+        self.assertEqual(len(archive), stored_zip_size(entries))
+        with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertIn('subdir/数据.bin', zip_file.namelist())
+
+    def test_stream_zip_file_grew(self):
+        """
+        Test that a file growing after it was listed does not change the archive size.
+        """
+        entries = list(zip_entries(self.upload_folder))
+        with open(self.upload_folder / 'file1.txt', 'a') as f:
+            f.write(' Appended after listing.')
+
+        archive = b''.join(stream_zip(self.upload_folder, entries=entries))
+
+        self.assertEqual(len(archive), stored_zip_size(entries))
+        with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+            self.assertEqual(zip_file.read('file1.txt'), b'This is file1.')
+
+    def test_stream_zip_file_shrank(self):
+        """
+        Test that stream_zip fails rather than sending a short archive when a file shrinks.
+        """
+        entries = list(zip_entries(self.upload_folder))
+        (self.upload_folder / 'file1.txt').write_text('Short')
+
+        with self.assertRaises(OSError):
+            b''.join(stream_zip(self.upload_folder, entries=entries))
+
     def test_create_logger(self):
         """
         Test that create_logger returns a logger instance.
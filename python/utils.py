@@ -2,93 +2,700 @@
 import os
 import subprocess
 import io
+import atexit
+import queue
+import hashlib
+import time
+import uuid
+import mimetypes
+import shutil
+import struct
+import tarfile
+import tempfile
+import threading
+import unicodedata
 import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from flask import send_file
+from urllib.parse import quote
+from flask import Response, abort, send_file, stream_with_context
+from werkzeug.exceptions import HTTPException
 from python.config import Config, OUTPUT_DIR
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Every logger from create_logger shares one rotating utils.log. Records are
+# queued and written by a QueueListener thread, so file writes and rollovers
+# never stall the request thread that logged. The thread is started by the
+# first record a process logs rather than at import: threads do not survive
+# fork(), so one started in a preloading parent would leave workers without it.
+_log_queue = queue.SimpleQueue()
+_log_file_handler = RotatingFileHandler('utils.log', maxBytes=5*1024*1024, backupCount=5, delay=True)  # 5 MB per file, 5 backups
+_log_file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s'))
+_log_listener_pid = None
+_log_listener_lock = threading.Lock()
+
+def _start_log_listener():
+    global _log_listener_pid
+    with _log_listener_lock:
+        if _log_listener_pid == os.getpid():
+            return
+        listener = QueueListener(_log_queue, _log_file_handler)
+        listener.start()
+        atexit.register(listener.stop)  # Flushes queued records on shutdown
+        _log_listener_pid = os.getpid()
+
+class _LazyQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        if _log_listener_pid != os.getpid():
+            _start_log_listener()
+        super().enqueue(record)
+
+# The same LOG_LEVEL app.py gives the root logger; FFS_LOG_LEVEL overrides it for these loggers only
+_LOG_LEVEL = (os.environ.get('FFS_LOG_LEVEL') or os.environ.get('LOG_LEVEL') or 'INFO').upper()
+
+def create_logger(name: str = __name__) -> logging.Logger:
+    """
+    Creates a logger with the specified name that writes to the rotating utils.log.
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        logger.addHandler(_LazyQueueHandler(_log_queue))
+        logger.setLevel(_LOG_LEVEL)
+    return logger
 
 # Configure logging for the utility module
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-handler = RotatingFileHandler('utils.log', maxBytes=5*1024*1024, backupCount=5)  # 5 MB per file, 5 backups
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
-def is_7z_available():
+logger = create_logger(__name__)
+
+# libdeflate (through the optional `deflate` package) emits the same raw DEFLATE
+# stream as zlib at 2-3x the speed, but only compresses whole buffers.
+try:
+    import deflate as libdeflate
+except ImportError:
+    libdeflate = None
+
+# One crc32 for every entry this module checksums itself, picked once. zlib-ng's
+# dispatches to PCLMULQDQ/VPCLMULQDQ folding kernels (crc32_fold_*) and libdeflate's
+# is vectorised as well; both beat stock zlib's table-driven loop. zipfile keeps its own.
+try:
+    from zlib_ng.zlib_ng import crc32
+except ImportError:
+    crc32 = libdeflate.crc32 if libdeflate is not None else zlib.crc32
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Formats that are already compressed; deflating them again costs CPU and saves
+# next to nothing, so they are stored as-is in ZIP archives
+_INCOMPRESSIBLE = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.mkv', '.webm', '.mp3',
+    '.opus', '.flac', '.zip', '.7z', '.gz', '.xz', '.zst', '.bz2', '.br',
+})
+
+# One pool for all archive work (parallel deflate, parallel extraction), shared
+# across requests so no request pays for spawning threads. Tasks on it never
+# wait on other tasks on it, so it cannot deadlock.
+_ARCHIVE_POOL = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 2), thread_name_prefix='ffs-archive')
+atexit.register(_ARCHIVE_POOL.shutdown, wait=False)
+
+# Probed once at import; a PATH lookup instead of spawning 7z on every request
+HAS_7Z = shutil.which('7z') is not None
+HAS_ZSTD = zstandard is not None
+
+def _deflate_bytes(data: bytes, level: int = Config.ZIP_COMPRESS_LEVEL) -> tuple[bytes, int]:
+    """
+    Compresses a whole buffer to a raw DEFLATE stream, as stored in ZIP entries.
+    Uses libdeflate when it is installed and zlib otherwise.
+
+    Returns:
+        tuple[bytes, int]: The compressed data and the CRC32 of the input.
+    """
+    if libdeflate is not None:
+        return libdeflate.deflate_compress(data, level), crc32(data)
+    # Setting up a 32 KiB window dominates the cost for small files. A window
+    # no larger than the data compresses identically, and any inflater reads it.
+    wbits = max(9, min(15, (len(data) - 1).bit_length()))
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -wbits)
+    return compressor.compress(data) + compressor.flush(), crc32(data)
+
+def _write_precompressed(zip_file: zipfile.ZipFile, zinfo: zipfile.ZipInfo, compressed: bytes, crc: int, file_size: int):
+    """
+    Appends an entry whose data is already compressed. zipfile has no public API
+    for this, so the local header is written here and the entry is registered
+    for the central directory the same way ZipFile.open(..., 'w') does it.
+    """
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(compressed)
+    zip64 = file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    zip_file.fp.write(compressed)
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+    zip_file.start_dir = zip_file.fp.tell()
+
+def _write_entry(zip_file: zipfile.ZipFile, file_path: str, zinfo: zipfile.ZipInfo, chunk_size: int = Config.STREAM_CHUNK_SIZE):
+    """
+    Adds a single file to an open archive, yielding after each chunk so a
+    streaming caller can pass the output on. ZipFile.write copies in 8 KB
+    pieces; copying in large chunks hands the CRC32 and the compressor whole buffers.
+    Exactly zinfo.file_size bytes are copied, so the archive matches the size
+    stored_zip_size promised even if the file grows meanwhile; a file that has
+    shrunk raises OSError. Files smaller than one chunk are read in a single call.
+    """
+    zinfo._compresslevel = zip_file.compresslevel
+    with open(file_path, 'rb') as src, zip_file.open(zinfo, 'w') as dest:
+        remaining = zinfo.file_size
+        while remaining:
+            chunk = src.read(min(remaining, chunk_size))
+            if not chunk:
+                raise OSError(f"{file_path} shrank while it was being archived")
+            dest.write(chunk)
+            remaining -= len(chunk)
+            if remaining:
+                yield
+    yield
+
+def _write_stored(zip_file: zipfile.ZipFile, file_path: str, zinfo: zipfile.ZipInfo, chunk_size: int = Config.STREAM_CHUNK_SIZE):
+    """
+    Adds a single file to an open archive without compression, yielding after
+    each chunk. The output is what ZipFile.open(zinfo, 'w') writes to an
+    unseekable file (local header, data, data descriptor), so stored_zip_size
+    holds, but the CRC is taken with this module's crc32 rather than zipfile's
+    stock zlib one. Like _write_entry, exactly zinfo.file_size bytes are copied.
+    """
+    zinfo.flag_bits |= 0x08  # CRC and sizes follow the data in a data descriptor
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT  # zipfile's guess before writing
+    zip_file._writecheck(zinfo)
+    zip_file._didModify = True
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file.fp.write(zinfo.FileHeader(zip64))
+    
+    crc = 0
+    with open(file_path, 'rb') as src:
+        remaining = zinfo.file_size
+        while remaining:
+            chunk = src.read(min(remaining, chunk_size))
+            if not chunk:
+                raise OSError(f"{file_path} shrank while it was being archived")
+            zip_file.fp.write(chunk)
+            crc = crc32(chunk, crc)
+            remaining -= len(chunk)
+            if remaining:
+                yield
+    
+    zinfo.CRC = crc
+    zinfo.compress_size = zinfo.file_size
+    zip_file.fp.write(struct.pack('<LLQQ' if zip64 else '<LLLL', 0x08074b50, crc, zinfo.file_size, zinfo.file_size))
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+    zip_file.start_dir = zip_file.fp.tell()
+    yield
+
+def partial_upload_name(filename: str) -> str:
+    """
+    Returns the hidden name an upload of filename is written under until it
+    is complete and renamed into place.
+    """
+    return f".{filename}.{uuid.uuid4().hex}.part"
+
+def is_partial_upload(name: str) -> bool:
+    """
+    Tells whether a directory entry is an unfinished upload from partial_upload_name,
+    which listings and archives leave out.
+    """
+    return name.startswith('.') and name.endswith('.part')
+
+def _skip_partial_uploads(tarinfo: tarfile.TarInfo) -> tarfile.TarInfo | None:
+    return None if is_partial_upload(os.path.basename(tarinfo.name)) else tarinfo
+
+def _iter_files(root: str):
+    """
+    Yields a DirEntry for every regular file under root. scandir returns the
+    entry type with the names, and symlinks are neither followed nor archived.
+    Unfinished uploads are skipped.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if is_partial_upload(entry.name):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+class _StatZipInfo(zipfile.ZipInfo):
+    """
+    A ZipInfo that also keeps the file's st_mtime_ns; the ZIP header only
+    holds the time to two seconds, which is too coarse for zip_fingerprint.
+    """
+    __slots__ = ('mtime_ns',)
+
+def _zipinfo_for(entry: os.DirEntry, arcname: str) -> zipfile.ZipInfo:
+    """
+    Builds the same ZipInfo as ZipInfo.from_file, but from the entry's cached
+    stat instead of a fresh one.
+    """
+    st = entry.stat(follow_symlinks=False)
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)  # Earliest time a ZIP header can hold
+    zinfo = _StatZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    zinfo.mtime_ns = st.st_mtime_ns
+    return zinfo
+
+def zip_entries(directory: Path):
+    """
+    Yields (path, ZipInfo) for every file that goes into an archive of
+    directory. Materialise it with list() to size or reuse the entry list.
+    """
+    root = os.fspath(directory)
+    prefix_len = len(os.path.join(root, ''))
+    for entry in _iter_files(root):
+        yield entry.path, _zipinfo_for(entry, entry.path[prefix_len:])
+
+def stored_zip_size(entries) -> int:
+    """
+    Returns the exact size of the archive stream_zip writes for entries with
+    ZIP_STORED, so the response can carry a Content-Length. Mirrors zipfile's
+    layout for an unseekable output: local header, data, data descriptor, and
+    ZIP64 records wherever zipfile adds them.
+    """
+    offset = 0
+    central_size = 0
+    count = 0
+    for _, zinfo in entries:
+        try:
+            name_len = len(zinfo.filename.encode('ascii'))
+        except UnicodeEncodeError:
+            name_len = len(zinfo.filename.encode('utf-8'))
+        zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT  # zipfile's guess before writing
+        zip64_fields = (zinfo.file_size > zipfile.ZIP64_LIMIT) * 16 + (offset > zipfile.ZIP64_LIMIT) * 8
+        central_size += 46 + name_len + (4 + zip64_fields if zip64_fields else 0)
+        offset += 30 + name_len + (20 if zip64 else 0) + zinfo.file_size + (24 if zip64 else 16)
+        count += 1
+    size = offset + central_size + 22
+    if count > zipfile.ZIP_FILECOUNT_LIMIT or offset > zipfile.ZIP64_LIMIT or central_size > zipfile.ZIP64_LIMIT:
+        size += 56 + 20  # ZIP64 end of central directory record and locator
+    return size
+
+def _read_and_compress(file_path: str, compress_type: int, level: int) -> tuple[bytes, int, int]:
+    with open(file_path, 'rb') as src:
+        data = src.read()
+    if compress_type == zipfile.ZIP_STORED:
+        return data, crc32(data), len(data)
+    compressed, crc = _deflate_bytes(data, level)
+    return compressed, crc, len(data)
+
+def _write_tree(zip_file: zipfile.ZipFile, directory: Path, entries=None):
+    """
+    Adds every file under directory to an open archive. Both libdeflate and zlib
+    release the GIL while compressing, so files up to Config.ZIP_WHOLE_FILE_LIMIT
+    are deflated on the shared archive pool; this thread writes the finished entries in
+    walk order, keeping the output deterministic. At most
+    Config.ZIP_PARALLEL_BUFFER bytes of file data are in flight at once.
+    Already-compressed formats are stored rather than deflated.
+    
+    This is a generator that yields whenever output has been written; callers
+    that do not stream just exhaust it. entries, from zip_entries, saves a
+    second walk when the caller has already listed the directory.
+    """
+    level = zip_file.compresslevel or Config.ZIP_COMPRESS_LEVEL
+    pending = deque()
+    in_flight = 0
+    
+    def write_oldest():
+        nonlocal in_flight
+        zinfo, future = pending.popleft()
+        compressed, crc, size = future.result()
+        in_flight -= zinfo.file_size
+        _write_precompressed(zip_file, zinfo, compressed, crc, size)
+    
     try:
-        subprocess.run(['7z', '--help'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except FileNotFoundError:
-        return False
+        for file_path, zinfo in (zip_entries(directory) if entries is None else entries):
+            zinfo.compress_type = zip_file.compression
+            if zinfo.compress_type == zipfile.ZIP_DEFLATED and os.path.splitext(file_path)[1].lower() in _INCOMPRESSIBLE:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            
+            if zip_file.compression != zipfile.ZIP_DEFLATED or zinfo.file_size > Config.ZIP_WHOLE_FILE_LIMIT:
+                # Entries must go out in order, so drain before streaming this one
+                while pending:
+                    write_oldest()
+                    yield
+                write = _write_stored if zinfo.compress_type == zipfile.ZIP_STORED else _write_entry
+                yield from write(zip_file, file_path, zinfo)
+                continue
+            
+            while pending and in_flight + zinfo.file_size > Config.ZIP_PARALLEL_BUFFER:
+                write_oldest()
+                yield
+            pending.append((zinfo, _ARCHIVE_POOL.submit(_read_and_compress, file_path, zinfo.compress_type, level)))
+            in_flight += zinfo.file_size
+        
+        while pending:
+            write_oldest()
+            yield
+    finally:
+        # Non-empty only if the archive was abandoned (client gone or an error)
+        for _, future in pending:
+            future.cancel()
+
+class _StreamBuffer:
+    """
+    Write-only sink for zipfile that holds written bytes until they are drained.
+    It has no tell()/seek(), so zipfile writes data descriptors instead of
+    seeking back to patch local headers, which lets the archive be streamed.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
 
-def compress_directory(directory: Path, output_file: Path) -> tuple[Path, str]:
+def stream_zip(directory: Path, compression: int = zipfile.ZIP_STORED, entries=None):
     """
-    Compresses a directory using 7z if available, otherwise uses zip.
-    Falls back to zip if 7z compression fails.
+    Generates a ZIP archive of a directory piece by piece, so the response can
+    start immediately and neither memory nor disk holds the whole archive.
 
     Args:
-        directory (Path): The directory to compress.
-        output_file (Path): The path where the compressed file should be saved.
+        directory (Path): The directory to archive.
+        compression (int): zipfile.ZIP_STORED (default) or zipfile.ZIP_DEFLATED.
+        entries (list, optional): The directory's zip_entries, if already listed.
 
-    Returns:
-        tuple[Path, str]: The path to the compressed file and the mimetype.
+    Yields:
+        bytes: Consecutive pieces of the ZIP archive.
+    """
+    logger.debug("Streaming ZIP of directory: %s", directory)
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, 'w', compression, allowZip64=True, compresslevel=Config.ZIP_COMPRESS_LEVEL) as zip_file:
+        for _ in _write_tree(zip_file, directory, entries):
+            if data := sink.drain():
+                yield data
+    # Closing the archive writes the central directory
+    yield sink.drain()
+    logger.debug("Directory streamed successfully: %s", directory)
 
-    Raises:
-        Exception: If both 7z and zip compression fail.
+def zip_fingerprint(entries) -> str:
+    """
+    Returns a digest of an entry list from zip_entries. It covers every name,
+    size and st_mtime_ns that goes into the archive, so it changes whenever a
+    file is added, removed, renamed or rewritten.
+    """
+    digest = hashlib.sha1()
+    for _, zinfo in entries:
+        digest.update(f"{zinfo.filename}\0{zinfo.file_size:x}\0{zinfo.mtime_ns:x}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()[:16]
+
+def zip_cache_path(directory: Path, entries) -> Path:
+    """
+    Returns where the ZIP of a directory's current contents is cached, given
+    its entries from zip_entries. The name changes as soon as anything in the
+    directory changes.
+    """
+    key = hashlib.sha1(os.fsencode(directory)).hexdigest()
+    return Path(Config.ZIP_CACHE_DIR) / f"{key}-{zip_fingerprint(entries)}.zip"
+
+def prune_zip_cache(max_age: int = Config.ZIP_CACHE_MAX_AGE, max_bytes: int = Config.ZIP_CACHE_MAX_BYTES,
+                    keep: Path | None = None):
+    """
+    Removes cached ZIPs that have not been used for max_age seconds, then the
+    least recently used ones until the rest fit in max_bytes. Use is tracked
+    in st_atime so that st_mtime, and with it the ETag, stays stable.
+    keep, an archive about to be sent, is never removed.
     """
-    logger.debug(f"Compressing directory: {directory}")
-    if is_7z_available():
+    cutoff = time.time() - max_age
+    cached = []
+    try:
+        with os.scandir(Config.ZIP_CACHE_DIR) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.zip') or (keep is not None and entry.name == keep.name):
+                    continue  # Downloads still being written end in .part
+                st = entry.stat(follow_symlinks=False)
+                cached.append((st.st_atime, st.st_size, entry.path))
+    except FileNotFoundError:
+        return
+    
+    total = sum(size for _, size, _ in cached)
+    if keep is not None:
+        total += os.stat(keep).st_size
+    cached.sort()
+    for atime, size, path in cached:
+        if atime >= cutoff and total <= max_bytes:
+            break
         try:
-            mimetype = 'application/x-7z-compressed'
-            subprocess.run(['7z', 'a', str(output_file), str(directory)], check=True, capture_output=True, text=True)
-            logger.debug(f"Directory compressed successfully with 7z: {output_file}")
-            return output_file, mimetype
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"7z compression failed, falling back to zip: {e.stderr}")
-    
-    # If 7z is not available or failed, use zip
-    mimetype = 'application/zip'
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        logger.debug("Pruned cached ZIP: %s", path)
+
+def cache_stream(chunks, cache_path: Path):
+    """
+    Passes archive chunks through unchanged while writing them to cache_path.
+    The cache file only appears, via an atomic rename, once the archive is
+    complete; an interrupted download leaves nothing behind.
+
+    Args:
+        chunks (Iterable[bytes]): The archive being sent, e.g. from stream_zip.
+        cache_path (Path): Where the finished archive should be kept.
+
+    Yields:
+        bytes: The same chunks, in order.
+    """
+    os.makedirs(cache_path.parent, exist_ok=True)
+    temp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.part")
     try:
-        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    file_path = Path(root) / file
-                    zipf.write(file_path, file_path.relative_to(directory))
-        logger.debug(f"Directory compressed successfully with zip: {output_file}")
-        return output_file, mimetype
-    except Exception as e:
-        logger.error(f"Error compressing directory with zip: {str(e)}")
+        with open(temp_path, 'wb') as cache_file:
+            for chunk in chunks:
+                cache_file.write(chunk)
+                yield chunk
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        # Includes GeneratorExit when the client disconnects
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
         raise
+    
+    # Older versions of this folder's archive can never be served again
+    stale_prefix = cache_path.name.split('-', 1)[0] + '-'
+    for stale in cache_path.parent.glob(f"{stale_prefix}*.zip"):
+        if stale != cache_path:
+            stale.unlink(missing_ok=True)
+    prune_zip_cache(keep=cache_path)
+    logger.debug("Cached ZIP archive: %s", cache_path)
+
+def stream_7z(directory: Path, chunk_size: int = Config.STREAM_CHUNK_SIZE):
+    """
+    Generates a .tar.xz of a directory by piping a tar stream through 7z, so
+    nothing is staged on disk and the transfer starts while 7z is still
+    compressing. The 7z format itself cannot be written to a pipe, hence xz.
+
+    Args:
+        directory (Path): The directory to archive.
+        chunk_size (int): How many bytes to move through the pipe at a time.
+
+    Yields:
+        bytes: Consecutive pieces of the compressed archive.
+    """
+    logger.debug("Streaming 7z archive of directory: %s", directory)
+    proc = subprocess.Popen(
+        ['7z', 'a', '-bsp0', '-txz', '-si', '-so', 'dummy'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    
+    def feed():
+        try:
+            # tarfile copies in 16 KiB pieces and flushes 10 KiB records by default
+            with tarfile.open(fileobj=proc.stdin, mode='w|', bufsize=chunk_size, copybufsize=chunk_size) as tar:
+                tar.add(directory, arcname=Path(directory).name, filter=_skip_partial_uploads)
+        except OSError as e:
+            logger.warning("Stopped feeding 7z for %s: %s", directory, e)
+        finally:
+            proc.stdin.close()
+    
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        while chunk := proc.stdout.read(chunk_size):
+            yield chunk
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()  # Client went away before the archive was finished
+            proc.wait()
+            logger.info("7z stream of %s cancelled", directory)
+        elif proc.returncode != 0:
+            logger.error("7z exited with status %s while streaming %s", proc.returncode, directory)
+        else:
+            logger.debug("Directory streamed successfully with 7z: %s", directory)
+
+def stream_zstd(directory: Path, chunk_size: int = Config.STREAM_CHUNK_SIZE):
+    """
+    Generates a .tar.zst of a directory. A background thread writes the tar
+    stream through a multi-threaded zstd compressor into a pipe, which is read
+    here; the pipe's capacity bounds how far compression runs ahead.
+
+    Args:
+        directory (Path): The directory to archive.
+        chunk_size (int): How many bytes to move through the pipe at a time.
+
+    Yields:
+        bytes: Consecutive pieces of the compressed archive.
+    """
+    logger.debug("Streaming zstd archive of directory: %s", directory)
+    read_fd, write_fd = os.pipe()
+    failed = threading.Event()
+    
+    def feed():
+        cctx = zstandard.ZstdCompressor(level=Config.ZSTD_LEVEL, threads=-1)
+        try:
+            with open(write_fd, 'wb', buffering=0) as pipe, \
+                    cctx.stream_writer(pipe, closefd=False) as compressor, \
+                    tarfile.open(fileobj=compressor, mode='w|', bufsize=chunk_size, copybufsize=chunk_size) as tar:
+                tar.add(directory, arcname=Path(directory).name, filter=_skip_partial_uploads)
+        except Exception as e:
+            # BrokenPipeError here just means the client went away
+            if not isinstance(e, BrokenPipeError):
+                failed.set()
+                logger.error("zstd compression of %s failed: %s", directory, e)
+    
+    threading.Thread(target=feed, daemon=True).start()
+    with open(read_fd, 'rb', buffering=0) as pipe:
+        while chunk := pipe.read(chunk_size):
+            yield chunk
+    if not failed.is_set():
+        logger.debug("Directory streamed successfully with zstd: %s", directory)
+
+# archive_format -> (generator, extension, mimetype) for send_compressed
+_STREAMED_FORMATS = {
+    '7z': (stream_7z, 'tar.xz', 'application/x-xz'),
+    'zst': (stream_zstd, 'tar.zst', 'application/zstd'),
+}
 
-def send_compressed(directory: Path, archive_name: str) -> send_file:
+def send_compressed(directory: Path, archive_name: str, archive_format: str | None = None) -> Response:
     """
-    Sends a directory as a downloadable compressed archive to the client.
+    Streams a directory to the client as a compressed archive.
 
     Args:
         directory (Path): The directory to send.
-        archive_name (str): The name of the archive file to be sent.
+        archive_name (str): The download name, without extension.
+        archive_format (str, optional): 'zip', '7z' (a .tar.xz made by 7z) or
+            'zst' (a .tar.zst). Defaults to '7z' when 7z is installed, otherwise
+            'zip'. Formats whose tool is missing fall back to 'zip'.
 
     Returns:
-        Response: Flask response object containing the compressed file.
+        Response: Flask response object streaming the compressed archive.
 
     Raises:
         HTTPException: 500 Internal Server Error if compression fails.
     """
+    if archive_format is None:
+        archive_format = '7z' if HAS_7Z else 'zip'
+    available = {'7z': HAS_7Z, 'zst': HAS_ZSTD}
+    if not available.get(archive_format):
+        return send_zip(directory, f"{archive_name}.zip")
+    
+    generate, extension, mimetype = _STREAMED_FORMATS[archive_format]
     try:
-        compressed_file, mimetype = compress_directory(directory)
-        logger.info(f"Sending compressed archive: {archive_name}")
+        logger.info("Streaming compressed archive: %s.%s", archive_name, extension)
+        response = Response(stream_with_context(generate(directory)), mimetype=mimetype)
+        return set_attachment(response, f"{archive_name}.{extension}")
+    except Exception as e:
+        logger.exception("Error sending compressed archive for directory '%s': %s", directory, e)
+        abort(500, description="Failed to create compressed archive.")
+
+def _extract_members(archive: Path | bytes, members: list, extract_to: Path):
+    # io.BytesIO shares the bytes object, so each worker gets its own reader without a copy
+    source = io.BytesIO(archive) if isinstance(archive, bytes) else archive
+    with zipfile.ZipFile(source, 'r') as zip_ref:
+        for member in members:
+            zip_ref.extract(member, extract_to)
+
+def _extract_zip_parallel(archive: Path | bytes, extract_to: Path):
+    """
+    Extracts a ZIP archive, given as a path or as its bytes, with several worker
+    threads. ZipFile objects are not thread-safe, so each worker opens the
+    archive itself and extracts its own share of the members; zlib releases
+    the GIL while inflating.
+    """
+    with zipfile.ZipFile(io.BytesIO(archive) if isinstance(archive, bytes) else archive, 'r') as zip_ref:
+        infos = zip_ref.infolist()
+    
+    # Create every folder up front so the workers never race on makedirs
+    for info in infos:
+        parts = [part for part in info.filename.split('/') if part not in ('', '.', '..')]
+        folder_parts = parts if info.is_dir() else parts[:-1]
+        os.makedirs(os.path.join(extract_to, *folder_parts), exist_ok=True)
+    
+    members = [info for info in infos if not info.is_dir()]
+    workers = min(len(members), os.cpu_count() or 1)
+    if workers <= 1:
+        _extract_members(archive, members, extract_to)
+        return
+    
+    shares = [members[i::workers] for i in range(workers)]
+    # list() surfaces the first worker exception
+    list(_ARCHIVE_POOL.map(_extract_members, repeat(archive), shares, repeat(extract_to)))
+
+def set_attachment(response: Response, filename: str) -> Response:
+    """
+    Marks a response as a download named filename, the way send_file does:
+    Werkzeug quotes the name, and a name that is not ASCII, which a header
+    cannot carry as is, gets an ASCII fallback plus an RFC 5987 filename*.
+    """
+    try:
+        filename.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        response.headers.set('Content-Disposition', 'attachment',
+                             **{'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|')}"})
+    return response
+
+def send_download(file_path: str | Path, st: os.stat_result | None = None, download_name: str | None = None,
+                  root: str | Path | None = None, accel_prefix: str | None = None) -> Response:
+    """
+    Sends a file as an attachment. Conditional requests (If-None-Match,
+    If-Modified-Since) are answered with 304 using an ETag derived from the
+    file's mtime and size.
+
+    When nginx fronts the app and an X-Accel-Redirect prefix is configured for
+    root, only an X-Accel-Redirect header is returned and nginx streams the body
+    itself with sendfile(2). Otherwise send_file is used, which honours USE_X_SENDFILE and
+    the WSGI server's file_wrapper (gunicorn's uses sendfile as well).
+
+    Args:
+        file_path (str | Path): The file to send.
+        st (os.stat_result, optional): A stat of file_path the caller already has.
+        download_name (str, optional): Filename offered to the client; defaults to file_path's name.
+        root (str | Path, optional): The directory nginx's internal location is aliased to;
+            defaults to the resolved upload folder, matching the paths secure_path returns.
+        accel_prefix (str, optional): That location; defaults to Config.X_ACCEL_REDIRECT_PREFIX.
+
+    Returns:
+        Response: Flask response for the download.
+    """
+    prefix = Config.X_ACCEL_REDIRECT_PREFIX if accel_prefix is None else accel_prefix
+    if root is None:
+        root = os.path.realpath(Config.UPLOAD_FOLDER)
+    relative_path = os.path.relpath(file_path, root)
+    if not prefix or relative_path.startswith('..'):
+        if st is None:
+            st = os.stat(file_path)
         return send_file(
-            compressed_file,
-            mimetype=mimetype,
+            file_path,
             as_attachment=True,
-            download_name=archive_name
+            download_name=download_name,
+            conditional=True,
+            etag=f"{st.st_mtime_ns:x}-{st.st_size:x}",
+            last_modified=st.st_mtime
         )
-    except Exception as e:
-        logger.exception(f"Error sending compressed archive for directory '{directory}': {e}")
-        abort(500, description="Failed to create compressed archive.")
+    
+    filename = download_name or os.path.basename(file_path)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = Response(mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{quote(relative_path)}"
+    return set_attachment(response, filename)
 
 def extract_archive(archive_path: Path, extract_to: Path):
     """
@@ -98,19 +705,29 @@ def extract_archive(archive_path: Path, extract_to: Path):
         archive_path (Path): The path to the archive.
         extract_to (Path): The directory to extract files into.
 
+    Every failure is logged here, so background callers that may never
+    report the exception still leave a trace.
+
     Raises:
-        subprocess.CalledProcessError: If extraction fails.
+        subprocess.CalledProcessError: If 7z fails.
+        zipfile.BadZipFile: If the archive is not a valid ZIP.
     """
     try:
-        logger.debug(f"Extracting archive to: {extract_to}")
-        if archive_path.suffix.lower() == '.7z' and is_7z_available():
-            subprocess.run(['7z', 'x', str(archive_path), f'-o{extract_to}', '-y'], check=True, capture_output=True, text=True)
+        logger.debug("Extracting archive to: %s", extract_to)
+        if archive_path.suffix.lower() == '.7z' and HAS_7Z:
+            subprocess.run(['7z', 'x', '-bso0', '-bsp0', str(archive_path), f'-o{extract_to}', '-y'],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
         else:
-            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_to)
-        logger.info(f"Archive extracted successfully to: {extract_to}")
-    except (subprocess.CalledProcessError, zipfile.BadZipFile) as e:
-        logger.error(f"Error extracting archive: {str(e)}")
+            _extract_zip_parallel(archive_path, extract_to)
+        logger.info("Archive extracted successfully to: %s", extract_to)
+    except subprocess.CalledProcessError as e:
+        logger.error("Error extracting archive: %s: %s", e, e.stderr.decode(errors='replace'))
+        raise
+    except zipfile.BadZipFile as e:
+        logger.error("Error extracting archive: %s", e)
+        raise
+    except Exception as e:
+        logger.exception("Error extracting archive %s: %s", archive_path, e)
         raise
 
 def zip_directory(directory: Path) -> io.BytesIO:
@@ -123,25 +740,21 @@ def zip_directory(directory: Path) -> io.BytesIO:
     Returns:
         BytesIO: An in-memory bytes buffer containing the ZIP archive.
     """
-    logger.debug(f"Zipping directory: {directory}")
+    logger.debug("Zipping directory: %s", directory)
     zip_buffer = io.BytesIO()
 
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                file_path = Path(root) / file
-                # Compute the relative path for the archive relative to 'directory'
-                relative_path = file_path.relative_to(directory)
-                logger.debug(f"Adding {file_path} as {relative_path} to ZIP")
-                zip_file.write(file_path, arcname=relative_path)
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=Config.ZIP_COMPRESS_LEVEL) as zip_file:
+        for _ in _write_tree(zip_file, directory):
+            pass
 
     zip_buffer.seek(0)
-    logger.debug(f"Directory zipped successfully: {directory}")
+    logger.debug("Directory zipped successfully: %s", directory)
     return zip_buffer
 
-def send_zip(directory: Path, archive_name: str = "archive.zip") -> send_file:
+def send_zip(directory: Path, archive_name: str = "archive.zip") -> Response:
     """
-    Sends a directory as a downloadable ZIP archive to the client.
+    Streams a directory to the client as a deflated ZIP archive, built while
+    it is being sent.
 
     Args:
         directory (Path): The directory to send.
@@ -154,16 +767,11 @@ def send_zip(directory: Path, archive_name: str = "archive.zip") -> send_file:
         HTTPException: 500 Internal Server Error if zipping fails.
     """
     try:
-        zip_buffer = zip_directory(directory)
-        logger.info(f"Sending ZIP archive: {archive_name}")
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=archive_name
-        )
+        logger.info("Streaming ZIP archive: %s", archive_name)
+        response = Response(stream_with_context(stream_zip(directory, zipfile.ZIP_DEFLATED)), mimetype='application/zip')
+        return set_attachment(response, archive_name)
     except Exception as e:
-        logger.exception(f"Error sending ZIP archive for directory '{directory}': {e}")
+        logger.exception("Error sending ZIP archive for directory '%s': %s", directory, e)
         abort(500, description="Failed to create ZIP archive.")
 
 def unzip_file(zip_stream: io.BytesIO, extract_to: Path):
@@ -179,16 +787,38 @@ def unzip_file(zip_stream: io.BytesIO, extract_to: Path):
         HTTPException: 500 Internal Server Error for other exceptions.
     """
     try:
-        logger.debug(f"Unzipping archive to: {extract_to}")
+        logger.debug("Unzipping archive to: %s", extract_to)
         with zipfile.ZipFile(zip_stream) as zip_file:
-            # Prevent Zip Slip vulnerability
+            # Prevent Zip Slip vulnerability. Members are checked with string
+            # operations, and each distinct parent folder is resolved on disk
+            # once so an existing symlink under extract_to cannot lead outside it.
+            base = os.path.realpath(extract_to)
+            prefix = os.path.join(base, '')
+            checked_parents = set()
             for member in zip_file.namelist():
-                member_path = (extract_to / member).resolve()
-                if not member_path.is_relative_to(extract_to.resolve()):
-                    logger.error(f"Attempted Zip Slip attack with member: {member}")
+                member_path = os.path.normpath(os.path.join(prefix, member))
+                parent = os.path.dirname(member_path)
+                if not os.path.join(member_path, '').startswith(prefix):
+                    escapes = True
+                elif parent in checked_parents:
+                    escapes = False
+                else:
+                    escapes = os.path.commonpath([base, os.path.realpath(parent)]) != base
+                    checked_parents.add(parent)
+                if escapes:
+                    logger.error("Attempted Zip Slip attack with member: %s", member)
                     abort(400, description="Invalid ZIP file.")
-            zip_file.extractall(extract_to)
-        logger.info(f"ZIP archive extracted successfully to: {extract_to}")
+        
+        if isinstance(zip_stream, io.BytesIO):
+            _extract_zip_parallel(zip_stream.getvalue(), extract_to)
+        else:
+            # Workers need their own readers, so spool other streams to a file they can reopen
+            with tempfile.NamedTemporaryFile(suffix='.zip') as spooled:
+                zip_stream.seek(0)
+                shutil.copyfileobj(zip_stream, spooled, Config.STREAM_CHUNK_SIZE)
+                spooled.flush()
+                _extract_zip_parallel(Path(spooled.name), extract_to)
+        logger.info("ZIP archive extracted successfully to: %s", extract_to)
     except zipfile.BadZipFile:
         logger.exception("Received a bad ZIP file.")
         abort(400, description="Invalid ZIP file.")
@@ -196,27 +826,39 @@ def unzip_file(zip_stream: io.BytesIO, extract_to: Path):
         # Re-raise HTTP exceptions to be handled by Flask
         raise
     except Exception as e:
-        logger.exception(f"Error extracting ZIP file: {e}")
+        logger.exception("Error extracting ZIP file: %s", e)
         abort(500, description="Failed to extract ZIP archive.")
 
-def create_logger(name: str = __name__) -> logging.Logger:
+def secure_path(relative_path: str) -> Path:
     """
-    Creates a logger with the specified name and configures log rotation.
+    Resolves a user-supplied path inside the upload folder.
+
+    The path is resolved with os.path.realpath, which follows '..' and
+    symlinks the way the filesystem will (one lstat per component), and the
+    result must have the upload folder as its commonpath. Unlike a string
+    prefix check, this also catches escapes through symlinks.
+
+    Args:
+        relative_path (str): Path relative to Config.UPLOAD_FOLDER.
+
+    Returns:
+        Path: The resolved absolute path.
+
+    Raises:
+        HTTPException: 403 Forbidden if the path escapes the upload folder.
     """
-    logger = logging.getLogger(name)
-    if not logger.handlers:
-        handler = RotatingFileHandler('utils.log', maxBytes=5*1024*1024, backupCount=5)  # 5 MB per file, 5 backups
-        formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-    return logger
+    base = os.path.realpath(Config.UPLOAD_FOLDER)
+    target = os.path.realpath(os.path.join(base, relative_path))
+    if os.path.commonpath([base, target]) != base:
+        logger.warning("Blocked path outside the upload folder: %s", relative_path)
+        abort(403, description="Unauthorized access.")
+    return Path(target)
 
 def allowed_file(filename):
     """
     Check if the file extension is allowed.
     """
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in Config.ALLOWED_EXTENSIONS
 
 # Additional utility functions can be added here as needed.
\ No newline at end of file